@@ -86,7 +86,8 @@ class NBVICalibrator:
     """
     
     def __init__(self, buffer_size=None, mvs_window_size=None,
-                 percentile=5, alpha=0.75, min_spacing=1, noise_gate_percentile=15):
+                 percentile=5, alpha=0.75, min_spacing=1, noise_gate_percentile=15,
+                 buffer_file=None):
         """
         Initialize NBVI calibrator
         
@@ -97,9 +98,10 @@ class NBVICalibrator:
             alpha: NBVI weighting factor (default: 0.75)
             min_spacing: Minimum spacing between subcarriers (default: 1)
             noise_gate_percentile: Percentile for noise gate (default: 15)
+            buffer_file: Path of the packet buffer file (default: BUFFER_FILE)
         """
         self.buffer_size = buffer_size if buffer_size is not None else CALIBRATION_BUFFER_SIZE
-        self._buffer_file = BUFFER_FILE
+        self._buffer_file = buffer_file if buffer_file is not None else BUFFER_FILE
         self._packet_count = 0
         self._filtered_count = 0
         self._file = None
@@ -112,12 +114,12 @@ class NBVICalibrator:
         
         # Remove old buffer file if exists
         try:
-            os.remove(BUFFER_FILE)
+            os.remove(self._buffer_file)
         except OSError:
             pass
         
         # Open file for writing
-        self._file = open(BUFFER_FILE, 'wb')
+        self._file = open(self._buffer_file, 'wb')
         
         # NBVI parameters
         self.mvs_window_size = mvs_window_size if mvs_window_size is not None else SEG_WINDOW_SIZE
@@ -569,11 +571,23 @@ class NBVICalibrator:
             
             # Build metrics from stats
             all_metrics = []
+            _INF = float('inf')
             for sc in range(NUM_SUBCARRIERS):
                 # Extract values for this subcarrier
                 vals = [raw_data[i * NUM_SUBCARRIERS + sc] for i in range(count)]
                 
                 mean = sum(vals) / count
+                
+                # Guard band, DC and null subcarriers never pass the noise gate:
+                # skip their std/entropy/MAD (two sorts and a histogram each)
+                if (sc < GUARD_BAND_LOW or sc > GUARD_BAND_HIGH or sc == DC_SUBCARRIER
+                        or mean < NULL_SUBCARRIER_THRESHOLD):
+                    all_metrics.append({
+                        'nbvi': _INF, 'nbvi_classic': _INF, 'nbvi_entropy': _INF,
+                        'nbvi_mad': _INF, 'mean': mean, 'std': 0.0, 'subcarrier': sc,
+                    })
+                    continue
+                
                 diffs = [v - mean for v in vals]
                 var = sum(d * d for d in diffs) / count
                 std = math.sqrt(var) if var > 0 else 0.0
@@ -603,16 +617,6 @@ class NBVICalibrator:
 
                 metrics = self._calculate_nbvi_from_stats(mean, std, mad=mad, entropy=entropy)
                 metrics['subcarrier'] = sc
-                
-                _INF = float('inf')
-                if sc < GUARD_BAND_LOW or sc > GUARD_BAND_HIGH or sc == DC_SUBCARRIER:
-                    metrics['nbvi_classic'] = _INF
-                    metrics['nbvi_entropy'] = _INF
-                    metrics['nbvi_mad'] = _INF
-                elif metrics['mean'] < NULL_SUBCARRIER_THRESHOLD:
-                    metrics['nbvi_classic'] = _INF
-                    metrics['nbvi_entropy'] = _INF
-                    metrics['nbvi_mad'] = _INF
 
                 # Default for _apply_noise_gate compatibility
                 metrics['nbvi'] = metrics['nbvi_classic']
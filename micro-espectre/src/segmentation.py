@@ -11,11 +11,13 @@ License: GPLv3
 import math
 
 try:
-    from src.utils import to_signed_int8, calculate_variance
+    from src.utils import calculate_variance
     from src.detector_interface import MotionState
+    from src.filters import HampelFilter, LowPassFilter
 except ImportError:
-    from utils import to_signed_int8, calculate_variance
+    from utils import calculate_variance
     from detector_interface import MotionState
+    from filters import HampelFilter, LowPassFilter
 
 
 class SegmentationContext:
@@ -77,19 +79,30 @@ class SegmentationContext:
         # Current metrics
         self.current_moving_variance = 0.0
         self.last_turbulence = 0.0
+        # True when the buffer changed since the variance was last computed
+        self._variance_stale = False
+        
+        # Metrics dict returned by get_metrics()/update_state(), updated in
+        # place on every call so publishing does not allocate a new dict
+        self._metrics = {
+            'moving_variance': 0.0,
+            'threshold': threshold,
+            'turbulence': 0.0,
+            'state': self.STATE_IDLE
+        }
         
         # Last amplitudes (stored for external use)
         self.last_amplitudes = None
         
+        # Byte offsets for the last subcarrier selection / payload length
+        self._offsets = None
+        self._offsets_selection = None
+        self._offsets_len = -1
+        
         # Initialize low-pass filter if enabled
         self.lowpass_filter = None
         if enable_lowpass:
             try:
-                # Try MicroPython path first, then standard Python path
-                try:
-                    from src.filters import LowPassFilter
-                except ImportError:
-                    from filters import LowPassFilter
                 self.lowpass_filter = LowPassFilter(
                     cutoff_hz=lowpass_cutoff,
                     sample_rate_hz=100.0,
@@ -103,11 +116,6 @@ class SegmentationContext:
         self.hampel_filter = None
         if enable_hampel:
             try:
-                # Try MicroPython path first, then standard Python path
-                try:
-                    from src.filters import HampelFilter
-                except ImportError:
-                    from filters import HampelFilter
                 self.hampel_filter = HampelFilter(
                     window_size=hampel_window,
                     threshold=hampel_threshold
@@ -151,40 +159,59 @@ class SegmentationContext:
         Returns:
             tuple: (turbulence, amplitudes) - turbulence value and amplitude list
         """
-        if len(csi_data) < 2:
-            return 0.0, []
+        offsets = SegmentationContext._subcarrier_offsets(selected_subcarriers, len(csi_data))
+        return SegmentationContext._spatial_turbulence_at(csi_data, offsets, use_cv_normalization)
+    
+    @staticmethod
+    def _subcarrier_offsets(selected_subcarriers, n_bytes):
+        """
+        Byte offsets of the I/Q pairs to read for a subcarrier selection
         
-        # Calculate amplitudes for selected subcarriers
-        amplitudes = []
+        Subcarriers whose pair does not fit in n_bytes are dropped.
         
-        # If no selection provided, use all available up to 64 subcarriers
+        Args:
+            selected_subcarriers: list of subcarrier indices (None = all up to 64)
+            n_bytes: CSI payload length
+        
+        Returns:
+            Sequence of even byte offsets (imaginary part at i, real at i + 1)
+        """
         if selected_subcarriers is None:
-            max_values = min(128, len(csi_data))
-            for i in range(0, max_values, 2):
-                if i + 1 < max_values:
-                    # Espressif CSI format: [Imaginary, Real, ...] per subcarrier
-                    # CSI values are signed int8 stored as uint8
-                    imag = float(to_signed_int8(csi_data[i]))
-                    real = float(to_signed_int8(csi_data[i + 1]))
-                    amplitudes.append(math.sqrt(real * real + imag * imag))
-        else:
-            # Use only selected subcarriers (matches C version)
-            for sc_idx in selected_subcarriers:
-                i = sc_idx * 2
-                if i + 1 < len(csi_data):
-                    # Espressif CSI format: [Imaginary, Real, ...] per subcarrier
-                    # CSI values are signed int8 stored as uint8
-                    imag = float(to_signed_int8(csi_data[i]))
-                    real = float(to_signed_int8(csi_data[i + 1]))
-                    amplitudes.append(math.sqrt(real * real + imag * imag))
-        
-        if len(amplitudes) < 2:
-            return 0.0, amplitudes
+            return range(0, min(128, n_bytes) - 1, 2)
+        return [sc_idx * 2 for sc_idx in selected_subcarriers if sc_idx * 2 + 1 < n_bytes]
+    
+    @staticmethod
+    def _spatial_turbulence_at(csi_data, offsets, use_cv_normalization):
+        """Turbulence and amplitudes for the I/Q pairs at the given byte offsets"""
+        # Single pass: amplitudes and their sum (for the mean) together.
+        # Espressif CSI format: [Imaginary, Real, ...] per subcarrier;
+        # values are signed int8 stored as uint8 (sign fixed up inline,
+        # same as to_signed_int8, after float() so int8 inputs cannot overflow)
+        sqrt = math.sqrt
+        amplitudes = []
+        total = 0.0
+        for i in offsets:
+            imag = float(csi_data[i])
+            real = float(csi_data[i + 1])
+            if imag > 127.0:
+                imag -= 256.0
+            if real > 127.0:
+                real -= 256.0
+            amp = sqrt(real * real + imag * imag)
+            amplitudes.append(amp)
+            total += amp
         
-        # Calculate variance using two-pass for spatial turbulence (small N=12)
         n = len(amplitudes)
-        mean = sum(amplitudes) / n
-        variance = sum((x - mean) ** 2 for x in amplitudes) / n
+        if n < 2:
+            return 0.0, amplitudes
+        
+        # Two-pass variance for spatial turbulence (small N=12)
+        mean = total / n
+        acc = 0.0
+        for x in amplitudes:
+            d = x - mean
+            acc += d * d
+        variance = acc / n
         
         if use_cv_normalization:
             # CV normalization: std/mean (gain-invariant)
@@ -212,8 +239,16 @@ class SegmentationContext:
         
         Note: Stores last amplitudes for feature calculation at publish time.
         """
-        turbulence, amplitudes = self.compute_spatial_turbulence(
-            csi_data, selected_subcarriers, self.use_cv_normalization
+        # The selection is the same list for every packet (replaced, never
+        # mutated, on recalibration), so its byte offsets are cached
+        n_bytes = len(csi_data)
+        if selected_subcarriers is not self._offsets_selection or n_bytes != self._offsets_len:
+            self._offsets = self._subcarrier_offsets(selected_subcarriers, n_bytes)
+            self._offsets_selection = selected_subcarriers
+            self._offsets_len = n_bytes
+        
+        turbulence, amplitudes = self._spatial_turbulence_at(
+            csi_data, self._offsets, self.use_cv_normalization
         )
         self.last_amplitudes = amplitudes
         if return_amplitudes:
@@ -231,8 +266,9 @@ class SegmentationContext:
         if self.buffer_count < self.window_size:
             return 0.0
         
-        # Delegate to static method
-        return self.compute_variance_two_pass(self.turbulence_buffer[:self.buffer_count])
+        # Buffer is full, so the whole ring is the window: pass it directly
+        # instead of copying a slice on every call
+        return calculate_variance(self.turbulence_buffer)
     
     def set_adaptive_threshold(self, threshold):
         """
@@ -280,12 +316,15 @@ class SegmentationContext:
         
         self.last_turbulence = filtered_turbulence
         
-        # Store value in circular buffer
-        self.turbulence_buffer[self.buffer_index] = filtered_turbulence
-        self.buffer_index = (self.buffer_index + 1) % self.window_size
+        # Store value in circular buffer (wrap by compare instead of modulo)
+        idx = self.buffer_index
+        self.turbulence_buffer[idx] = filtered_turbulence
+        idx += 1
+        self.buffer_index = 0 if idx == self.window_size else idx
         if self.buffer_count < self.window_size:
             self.buffer_count += 1
         
+        self._variance_stale = True
         self.packet_index += 1
     
     def update_state(self):
@@ -298,20 +337,20 @@ class SegmentationContext:
         Returns:
             dict: Current metrics (moving_variance, threshold, turbulence, state)
         """
-        # Calculate variance using two-pass algorithm
-        self.current_moving_variance = self._calculate_variance_two_pass()
-        
-        # State machine (simplified)
-        if self.state == self.STATE_IDLE:
-            # Check for motion start
-            if self.current_moving_variance > self.threshold:
-                self.state = self.STATE_MOTION
-        
-        elif self.state == self.STATE_MOTION:
-            # Check for motion end
-            if self.current_moving_variance < self.threshold:
-                # Motion ended
-                self.state = self.STATE_IDLE
+        # Calculate variance using two-pass algorithm (only if new samples
+        # arrived: repeated publishes without packets reuse the last value)
+        if self._variance_stale:
+            self.current_moving_variance = self._calculate_variance_two_pass()
+            self._variance_stale = False
+        
+        # State machine (simplified): above threshold -> MOTION, below -> IDLE,
+        # exactly at threshold -> keep the current state. Independent of the
+        # current state, so no per-state branch is needed.
+        variance = self.current_moving_variance
+        if variance > self.threshold:
+            self.state = self.STATE_MOTION
+        elif variance < self.threshold:
+            self.state = self.STATE_IDLE
         
         return self.get_metrics()
     
@@ -320,13 +359,18 @@ class SegmentationContext:
         return self.state
     
     def get_metrics(self):
-        """Get current metrics as dict"""
-        return {
-            'moving_variance': self.current_moving_variance,
-            'threshold': self.threshold,
-            'turbulence': self.last_turbulence,
-            'state': self.state
-        }
+        """
+        Get current metrics as dict
+        
+        The same dict is reused across calls (no allocation per publish);
+        copy it if a snapshot must outlive the next call.
+        """
+        metrics = self._metrics
+        metrics['moving_variance'] = self.current_moving_variance
+        metrics['threshold'] = self.threshold
+        metrics['turbulence'] = self.last_turbulence
+        metrics['state'] = self.state
+        return metrics
     
     def reset(self, full=False):
         """
@@ -340,10 +384,17 @@ class SegmentationContext:
         self.packet_index = 0
         
         if full:
-            self.turbulence_buffer = [0.0] * self.window_size
+            buf = self.turbulence_buffer
+            if len(buf) == self.window_size:
+                # Clear in place: keep the pre-allocated buffer (no heap churn)
+                for i in range(self.window_size):
+                    buf[i] = 0.0
+            else:
+                self.turbulence_buffer = [0.0] * self.window_size
             self.buffer_index = 0
             self.buffer_count = 0
             self.current_moving_variance = 0.0
+            self._variance_stale = False
             self.last_turbulence = 0.0
             self.last_amplitudes = None
             
@@ -174,18 +174,23 @@ def calculate_variance(values):
     More stable than single-pass E[X²] - E[X]² for float arithmetic.
     
     Args:
-        values: List of numeric values
+        values: Sequence of numeric values (list, array, ring buffer)
     
     Returns:
         float: Variance (0.0 if empty)
     """
-    if not values:
+    n = len(values)
+    if n == 0:
         return 0.0
     
-    n = len(values)
     mean = sum(values) / n
-    variance = sum((x - mean) ** 2 for x in values) / n
-    return variance
+    # Plain loop instead of a generator + ** 2: no per-element frame resume
+    # or pow dispatch (same accumulation order as the C++ version)
+    acc = 0.0
+    for x in values:
+        d = x - mean
+        acc += d * d
+    return acc / n
 
 
 def calculate_std(values):
@@ -9,6 +9,7 @@ License: GPLv3
 
 import sys
 import math
+import time
 import pytest
 import numpy as np
 import json
@@ -25,12 +26,28 @@ sys.path.insert(0, str(SRC_PATH))
 
 from config import DEFAULT_SUBCARRIERS, HAMPEL_WINDOW, HAMPEL_THRESHOLD
 
+# Add MicroPython-specific time functions to the time module (once per session)
+if not hasattr(time, 'ticks_ms'):
+    time.ticks_ms = lambda: int(time.time() * 1000)
+if not hasattr(time, 'ticks_us'):
+    time.ticks_us = lambda: int(time.time() * 1000000)
+if not hasattr(time, 'ticks_diff'):
+    time.ticks_diff = lambda t1, t2: t1 - t2
+if not hasattr(time, 'sleep_ms'):
+    time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+if not hasattr(time, 'sleep_us'):
+    time.sleep_us = lambda us: time.sleep(us / 1000000)
+
 # Data directory (shared between tests and tools)
 DATA_DIR = Path(__file__).parent.parent / 'data'
 DATASET_INFO_PATH = DATA_DIR / 'dataset_info.json'
 PAIR_MAX_DELTA_SECONDS = 30 * 60
 UNIT_TEST_SUBCARRIERS = DEFAULT_SUBCARRIERS
 
+# Contiguous 12-SC band starting at the first non-guard subcarrier
+# (not config.DEFAULT_SUBCARRIERS, which is a different, spaced band)
+CONTIGUOUS_TEST_BAND = tuple(range(11, 23))
+
 
 def get_default_fp_rate_target():
     """Match C++ get_default_fp_rate_target()."""
@@ -281,23 +298,46 @@ def synthetic_csi_packet():
     return iq_data
 
 
+def interleave_csi(I, Q, dtype=np.int8):
+    """
+    Pack separate real/imaginary planes into the Espressif CSI layout
+    
+    Espressif CSI format: [Imaginary, Real, ...] per subcarrier. Works on one
+    packet (1-D planes) or a batch ((N, num_subcarriers) planes). int8 output
+    is clipped to [-127, 127]; uint8 output (raw bytes) to [0, 255].
+    """
+    I = np.asarray(I)
+    Q = np.asarray(Q)
+    low, high = (-127, 127) if np.dtype(dtype) == np.int8 else (0, 255)
+    iq_data = np.empty(I.shape[:-1] + (2 * I.shape[-1],), dtype=dtype)
+    iq_data[..., 0::2] = np.clip(Q, low, high)      # Imaginary first
+    iq_data[..., 1::2] = np.clip(I, low, high)      # Real second
+    return iq_data
+
+
+def _synthetic_csi_packet(base_amplitude, noise_std):
+    """
+    One 64-subcarrier packet around base_amplitude, drawn from the global RNG
+    
+    I and Q are generated as two contiguous planes; noise is drawn in the
+    same (I, Q) per-subcarrier order as a scalar loop, and truncated toward
+    zero like int(), so seeded fixtures stay reproducible.
+    """
+    noise = np.random.normal(0, noise_std, (64, 2))
+    I = np.trunc(base_amplitude + noise[:, 0])
+    Q = np.trunc(base_amplitude * 0.3 + noise[:, 1])
+    return interleave_csi(I, Q)
+
+
 @pytest.fixture
 def synthetic_csi_baseline_packets():
     """Generate synthetic baseline CSI packets (stable signal)"""
     np.random.seed(42)
-    packets = []
-    for i in range(100):
-        # Stable signal with small variations
-        base_amplitude = 30
-        iq_data = np.zeros(128, dtype=np.int8)
-        for sc in range(64):
-            I = int(base_amplitude + np.random.normal(0, 2))
-            Q = int(base_amplitude * 0.3 + np.random.normal(0, 2))
-            # Espressif CSI format: [Imaginary, Real, ...] per subcarrier
-            iq_data[sc * 2] = np.clip(Q, -127, 127)      # Imaginary first
-            iq_data[sc * 2 + 1] = np.clip(I, -127, 127)  # Real second
-        packets.append({'csi_data': iq_data, 'label': 'baseline'})
-    return packets
+    # Stable signal with small variations
+    return [
+        {'csi_data': _synthetic_csi_packet(30, 2), 'label': 'baseline'}
+        for _ in range(100)
+    ]
 
 
 @pytest.fixture
@@ -308,14 +348,7 @@ def synthetic_csi_movement_packets():
     for i in range(100):
         # Variable signal with larger variations
         base_amplitude = 25 + np.random.uniform(-10, 10)
-        iq_data = np.zeros(128, dtype=np.int8)
-        for sc in range(64):
-            I = int(base_amplitude + np.random.normal(0, 8))
-            Q = int(base_amplitude * 0.3 + np.random.normal(0, 8))
-            # Espressif CSI format: [Imaginary, Real, ...] per subcarrier
-            iq_data[sc * 2] = np.clip(Q, -127, 127)      # Imaginary first
-            iq_data[sc * 2 + 1] = np.clip(I, -127, 127)  # Real second
-        packets.append({'csi_data': iq_data, 'label': 'movement'})
+        packets.append({'csi_data': _synthetic_csi_packet(base_amplitude, 8), 'label': 'movement'})
     return packets
 
 
@@ -323,7 +356,7 @@ def synthetic_csi_movement_packets():
 # Real CSI Data Fixtures (optional - skip if not available)
 # ============================================================================
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def real_csi_data_available():
     """Check if real CSI data files are available"""
     from csi_utils import find_dataset
@@ -334,56 +367,63 @@ def real_csi_data_available():
         return False
 
 
-@pytest.fixture
-def real_baseline_packets(real_csi_data_available):
-    """Load real baseline CSI packets (skip if not available)"""
+@pytest.fixture(scope="session")
+def _real_packets(real_csi_data_available):
+    """(baseline, movement) real CSI packets loaded once, or None if unavailable"""
     if not real_csi_data_available:
-        pytest.skip("Real CSI data not available")
+        return None
     
     from csi_utils import load_baseline_and_movement
-    baseline, _ = load_baseline_and_movement()
-    return baseline
+    return load_baseline_and_movement()
 
 
-@pytest.fixture
-def real_movement_packets(real_csi_data_available):
-    """Load real movement CSI packets (skip if not available)"""
-    if not real_csi_data_available:
+@pytest.fixture(scope="session")
+def real_baseline_packets(_real_packets):
+    """Load real baseline CSI packets (skip if not available)"""
+    if _real_packets is None:
         pytest.skip("Real CSI data not available")
-    
-    from csi_utils import load_baseline_and_movement
-    _, movement = load_baseline_and_movement()
-    return movement
+    return _real_packets[0]
 
 
-@pytest.fixture
-def real_turbulence_values(real_csi_data_available, default_subcarriers):
-    """Calculate turbulence values from real CSI data"""
-    if not real_csi_data_available:
+@pytest.fixture(scope="session")
+def real_movement_packets(_real_packets):
+    """Load real movement CSI packets (skip if not available)"""
+    if _real_packets is None:
         pytest.skip("Real CSI data not available")
+    return _real_packets[1]
+
+
+@pytest.fixture(scope="session")
+def _real_turbulence_array(_real_packets):
+    """
+    Turbulence trace for the real baseline+movement packets, computed once.
     
-    from csi_utils import load_baseline_and_movement, calculate_spatial_turbulence
-    
-    baseline, movement = load_baseline_and_movement()
-    turbulence_values = []
+    Returns None when real CSI data is not available.
+    """
+    if _real_packets is None:
+        return None
     
-    for packet in baseline:
-        turbulence = calculate_spatial_turbulence(
-            packet['csi_data'],
-            default_subcarriers,
-            gain_locked=packet.get('gain_locked', True)
-        )
-        turbulence_values.append(float(turbulence))
+    from csi_utils import calculate_spatial_turbulence
     
-    for packet in movement:
-        turbulence = calculate_spatial_turbulence(
+    baseline, movement = _real_packets
+    packets = baseline + movement
+    values = np.empty(len(packets), dtype=np.float64)
+    for i, packet in enumerate(packets):
+        values[i] = calculate_spatial_turbulence(
             packet['csi_data'],
-            default_subcarriers,
+            UNIT_TEST_SUBCARRIERS,
             gain_locked=packet.get('gain_locked', True)
         )
-        turbulence_values.append(float(turbulence))
-    
-    return turbulence_values
+    values.flags.writeable = False
+    return values
+
+
+@pytest.fixture
+def real_turbulence_values(_real_turbulence_array):
+    """Turbulence values from real CSI data (baseline then movement)"""
+    if _real_turbulence_array is None:
+        pytest.skip("Real CSI data not available")
+    return _real_turbulence_array
 
 
 # ============================================================================
@@ -404,8 +444,14 @@ import json
 import tempfile
 import os
 
-# Use a temp file to share results between test module and conftest hook
-_PERF_RESULTS_FILE = os.path.join(tempfile.gettempdir(), 'espectre_perf_results.json')
+# Use temp files to share results between test module and conftest hook.
+# One file per pytest-xdist worker ('main' when not distributed) so parallel
+# workers never race on the same file; the controller merges them.
+_PERF_RESULTS_DIR = Path(tempfile.gettempdir())
+_PERF_RESULTS_GLOB = 'espectre_perf_results_*.json'
+_PERF_RESULTS_FILE = _PERF_RESULTS_DIR / (
+    f"espectre_perf_results_{os.environ.get('PYTEST_XDIST_WORKER', 'main')}.json"
+)
 
 
 def record_performance(chip: str, algorithm: str, recall: float, fp_rate: float,
@@ -423,10 +469,9 @@ def record_performance(chip: str, algorithm: str, recall: float, fp_rate: float,
     """
     # Load existing results
     results = {}
-    if os.path.exists(_PERF_RESULTS_FILE):
+    if _PERF_RESULTS_FILE.exists():
         try:
-            with open(_PERF_RESULTS_FILE, 'r') as f:
-                results = json.load(f)
+            results = json.loads(_PERF_RESULTS_FILE.read_text())
         except (json.JSONDecodeError, IOError):
             results = {}
     
@@ -441,26 +486,46 @@ def record_performance(chip: str, algorithm: str, recall: float, fp_rate: float,
     }
     
     # Save
-    with open(_PERF_RESULTS_FILE, 'w') as f:
-        json.dump(results, f)
+    _PERF_RESULTS_FILE.write_text(json.dumps(results))
 
 
 def pytest_configure(config):
-    """Clear performance results at the start of test session."""
-    if os.path.exists(_PERF_RESULTS_FILE):
-        os.remove(_PERF_RESULTS_FILE)
+    """Register custom markers and clear performance results at session start."""
+    config.addinivalue_line(
+        "markers", "slow: requires full CSI generation or real dataset replay (skipped with PYTEST_FAST=1)"
+    )
+    # Only the controller (or a plain non-distributed run) resets results;
+    # pytest-xdist workers start after it and must not touch them.
+    if not hasattr(config, 'workerinput'):
+        for results_file in _PERF_RESULTS_DIR.glob(_PERF_RESULTS_GLOB):
+            results_file.unlink(missing_ok=True)
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip tests marked slow when PYTEST_FAST=1 (fast inner development loop)."""
+    if os.environ.get('PYTEST_FAST') != '1':
+        return
+    skip_slow = pytest.mark.skip(reason="slow test skipped (PYTEST_FAST=1)")
+    for item in items:
+        if 'slow' in item.keywords:
+            item.add_marker(skip_slow)
 
 
 def pytest_terminal_summary(terminalreporter, exitstatus, config):
     """Print performance summary table at the end of test session."""
-    if not os.path.exists(_PERF_RESULTS_FILE):
+    if hasattr(config, 'workerinput'):
         return
     
-    try:
-        with open(_PERF_RESULTS_FILE, 'r') as f:
-            results = json.load(f)
-    except (json.JSONDecodeError, IOError):
-        return
+    # Merge per-worker results
+    results_files = list(_PERF_RESULTS_DIR.glob(_PERF_RESULTS_GLOB))
+    results = {}
+    for results_file in results_files:
+        try:
+            worker_results = json.loads(results_file.read_text())
+        except (json.JSONDecodeError, IOError):
+            continue
+        for chip, algorithms in worker_results.items():
+            results.setdefault(chip, {}).update(algorithms)
     
     if not results:
         return
@@ -531,5 +596,6 @@ def pytest_terminal_summary(terminalreporter, exitstatus, config):
     terminalreporter.write_line("-" * 105)
     
     # Cleanup
-    os.remove(_PERF_RESULTS_FILE)
+    for results_file in results_files:
+        results_file.unlink(missing_ok=True)
 
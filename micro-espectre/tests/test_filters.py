@@ -143,6 +143,26 @@ class TestHampelFilterEdgeCases:
             assert math.isfinite(result)
 
 
+class TestHampelFilterBatch:
+    """Test the vectorized offline replay (csi_utils.hampel_filter_batch)"""
+    
+    @pytest.mark.parametrize("window_size", [2, 3, 5, 7])
+    def test_matches_per_sample_filter(self, window_size):
+        """Batch output equals feeding a fresh HampelFilter sample by sample"""
+        from csi_utils import hampel_filter_batch
+        
+        rng = np.random.default_rng(7)
+        values = rng.normal(1.0, 0.1, 200)
+        values[::17] += 5.0   # spikes
+        values[50:70] = 1.0   # flat span (MAD = 0)
+        
+        hf = HampelFilter(window_size=window_size, threshold=3.0)
+        expected = [hf.filter(v) for v in values.tolist()]
+        
+        result = hampel_filter_batch(values, window_size=window_size, threshold=3.0)
+        np.testing.assert_array_equal(result, expected)
+
+
 class TestHampelFilterCircularBuffer:
     """Test circular buffer behavior"""
     
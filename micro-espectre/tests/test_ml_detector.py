@@ -22,6 +22,7 @@ from src.ml_detector import (
     MLDetector, ML_DEFAULT_THRESHOLD, ML_METRIC_SCALE
 )
 from src.detector_interface import MotionState
+from tests.conftest import CONTIGUOUS_TEST_BAND
 
 
 class TestRelu:
@@ -284,12 +285,12 @@ class TestMLDetectorProcessing:
     def test_process_packet_increments_count(self, detector, sample_csi_data):
         """Processing packet increments packet count."""
         initial = detector._packet_count
-        detector.process_packet(sample_csi_data, list(range(11, 23)))
+        detector.process_packet(sample_csi_data, CONTIGUOUS_TEST_BAND)
         assert detector._packet_count == initial + 1
     
     def test_process_multiple_packets(self, detector, sample_csi_data):
         """Processing multiple packets fills buffer."""
-        subcarriers = list(range(11, 23))
+        subcarriers = CONTIGUOUS_TEST_BAND
         for _ in range(10):
             detector.process_packet(sample_csi_data, subcarriers)
         
@@ -298,7 +299,7 @@ class TestMLDetectorProcessing:
     
     def test_update_state_before_ready(self, detector, sample_csi_data):
         """Update state before buffer is full returns default values."""
-        detector.process_packet(sample_csi_data, list(range(11, 23)))
+        detector.process_packet(sample_csi_data, CONTIGUOUS_TEST_BAND)
         
         metrics = detector.update_state()
         
@@ -308,7 +309,7 @@ class TestMLDetectorProcessing:
     
     def test_update_state_after_ready(self, detector, sample_csi_data):
         """Update state after buffer is full runs inference."""
-        subcarriers = list(range(11, 23))
+        subcarriers = CONTIGUOUS_TEST_BAND
         for _ in range(10):
             detector.process_packet(sample_csi_data, subcarriers)
         
@@ -322,7 +323,7 @@ class TestMLDetectorProcessing:
     def test_tracking_enabled(self, detector, sample_csi_data):
         """Test that tracking records data when enabled."""
         detector.track_data = True
-        subcarriers = list(range(11, 23))
+        subcarriers = CONTIGUOUS_TEST_BAND
         
         for _ in range(10):
             detector.process_packet(sample_csi_data, subcarriers)
@@ -335,7 +336,7 @@ class TestMLDetectorProcessing:
     def test_tracking_disabled(self, detector, sample_csi_data):
         """Test that tracking does not record when disabled."""
         detector.track_data = False
-        subcarriers = list(range(11, 23))
+        subcarriers = CONTIGUOUS_TEST_BAND
         
         for _ in range(10):
             detector.process_packet(sample_csi_data, subcarriers)
@@ -355,7 +356,7 @@ class TestExtractFeaturesIntegration:
         
         # Fill buffer with synthetic data
         csi_data = [20] * 128  # 64 subcarriers * 2
-        subcarriers = list(range(11, 23))
+        subcarriers = CONTIGUOUS_TEST_BAND
         
         for _ in range(10):
             detector.process_packet(csi_data, subcarriers)
@@ -375,7 +376,7 @@ class TestMLDetectorMotionTracking:
         detector.track_data = True
         
         # Create varying CSI data to trigger motion
-        subcarriers = list(range(11, 23))
+        subcarriers = CONTIGUOUS_TEST_BAND
         for i in range(10):
             # Vary data to create turbulence
             csi_data = [(20 + i * 5) % 127] * 128
@@ -393,7 +394,7 @@ class TestMLDetectorMotionTracking:
         detector = MLDetector(window_size=10, threshold=0.0)
         detector.track_data = True
         
-        subcarriers = list(range(11, 23))
+        subcarriers = CONTIGUOUS_TEST_BAND
         for i in range(10):
             csi_data = [(20 + i * 5) % 127] * 128
             detector.process_packet(csi_data, subcarriers)
@@ -409,7 +410,7 @@ class TestMLDetectorMotionTracking:
         """Test that state changes to MOTION with low threshold."""
         detector = MLDetector(window_size=10, threshold=0.0)
         
-        subcarriers = list(range(11, 23))
+        subcarriers = CONTIGUOUS_TEST_BAND
         for i in range(10):
             csi_data = [50] * 128
             detector.process_packet(csi_data, subcarriers)
@@ -9,9 +9,12 @@ License: GPLv3
 """
 
 import pytest
+import math
 import numpy as np
+from bisect import bisect_left, insort
+from collections import deque
 from segmentation import SegmentationContext
-from csi_utils import calculate_spatial_turbulence
+from csi_utils import hampel_filter_batch, moving_variance_batch
 
 # Test configuration
 WINDOW_SIZE = 50
@@ -32,28 +35,30 @@ class OriginalRunningVariance:
         self.sum_sq = 0.0
     
     def add(self, value):
+        # Hot path: work on locals and write state back once per sample
+        idx = self.buffer_index
+        s = self.sum
+        s2 = self.sum_sq
         if self.buffer_count < self.window_size:
-            self.sum += value
-            self.sum_sq += value * value
             self.buffer_count += 1
         else:
-            old_value = self.buffer[self.buffer_index]
-            self.sum -= old_value
-            self.sum_sq -= old_value * old_value
-            self.sum += value
-            self.sum_sq += value * value
+            old_value = self.buffer[idx]
+            s -= old_value
+            s2 -= old_value * old_value
+        s += value
+        s2 += value * value
+        
+        self.buffer[idx] = value
+        idx += 1
+        self.buffer_index = 0 if idx == self.window_size else idx
+        self.sum = s
+        self.sum_sq = s2
         
-        self.buffer[self.buffer_index] = value
-        self.buffer_index = (self.buffer_index + 1) % self.window_size
-        return self._get_variance()
-    
-    def _get_variance(self):
         if self.buffer_count < self.window_size:
             return 0.0
         n = self.buffer_count
-        mean = self.sum / n
-        mean_sq = self.sum_sq / n
-        return max(0.0, mean_sq - mean * mean)
+        mean = s / n
+        return max(0.0, s2 / n - mean * mean)
 
 
 class OriginalHampelFilter:
@@ -62,18 +67,16 @@ class OriginalHampelFilter:
     def __init__(self, window_size=5, threshold=3.0):
         self.window_size = window_size
         self.threshold = threshold
-        self.buffer = []
+        # Bounded deque: appending to a full window evicts the oldest in O(1)
+        self.buffer = deque(maxlen=window_size)
     
     def filter(self, value):
         self.buffer.append(value)
-        if len(self.buffer) > self.window_size:
-            self.buffer.pop(0)
         
         if len(self.buffer) < 3:
             return value
         
-        sorted_buffer = list(self.buffer)
-        sorted_buffer.sort()
+        sorted_buffer = sorted(self.buffer)
         
         n = len(sorted_buffer)
         median = sorted_buffer[n // 2]
@@ -109,26 +112,37 @@ class OptimizedTwoPassVariance:
     def _calculate_variance_two_pass(self):
         if self.buffer_count < self.window_size:
             return 0.0
-        return SegmentationContext.compute_variance_two_pass(self.buffer[:self.buffer_count])
+        # Only reached with a full fixed-size window: the whole ring buffer is
+        # the window, so pass it directly instead of slicing a copy per call
+        return SegmentationContext.compute_variance_two_pass(self.buffer)
 
 
 class OptimizedHampelFilter:
-    """Hampel filter with pre-allocated buffers and insertion sort"""
+    """
+    Hampel filter with pre-allocated buffers and insertion sort
+    
+    sorted_buffer and deviations hold data in [1..n] with a -inf sentinel at
+    index 0, so the insertion sort's inner loop needs no j >= 0 bounds check.
+    """
     
     def __init__(self, window_size=5, threshold=3.0):
         self.window_size = window_size
         self.threshold = threshold
+        # Outlier test is |value - median| > threshold * 1.4826 * mad, so the
+        # per-sample path multiplies instead of dividing
+        self.scaled_threshold = threshold * 1.4826
         self.buffer = [0.0] * window_size
-        self.sorted_buffer = [0.0] * window_size
-        self.deviations = [0.0] * window_size
+        self.sorted_buffer = [-math.inf] + [0.0] * window_size
+        self.deviations = [-math.inf] + [0.0] * window_size
         self.count = 0
         self.index = 0
     
     def _insertion_sort(self, arr, n):
-        for i in range(1, n):
+        """Unguarded insertion sort of arr[1..n]; arr[0] is the -inf sentinel"""
+        for i in range(2, n + 1):
             key = arr[i]
             j = i - 1
-            while j >= 0 and arr[j] > key:
+            while arr[j] > key:
                 arr[j + 1] = arr[j]
                 j -= 1
             arr[j + 1] = key
@@ -145,16 +159,65 @@ class OptimizedHampelFilter:
         n = self.count
         
         for i in range(n):
-            self.sorted_buffer[i] = self.buffer[i]
+            self.sorted_buffer[i + 1] = self.buffer[i]
         
         self._insertion_sort(self.sorted_buffer, n)
-        median = self.sorted_buffer[n // 2]
+        median = self.sorted_buffer[n // 2 + 1]
         
         for i in range(n):
-            self.deviations[i] = abs(self.buffer[i] - median)
+            self.deviations[i + 1] = abs(self.buffer[i] - median)
         
         self._insertion_sort(self.deviations, n)
-        mad = self.deviations[n // 2]
+        mad = self.deviations[n // 2 + 1]
+        
+        if mad > 1e-6 and abs(value - median) > self.scaled_threshold * mad:
+            return median
+        
+        return value
+
+
+class SortedWindowHampelFilter:
+    """
+    Hampel filter over an incrementally maintained sorted window
+    
+    Each sample costs one bisect removal and one insort instead of a full
+    sort. The median is a direct lookup, and the MAD is read off by merging
+    the deviations on either side of the median, which are already sorted.
+    Uses the same upper median (index n // 2) as the other filters, so no
+    averaging for even n and the results are exact.
+    """
+    
+    def __init__(self, window_size=5, threshold=3.0):
+        self.window_size = window_size
+        self.threshold = threshold
+        self.ring = deque(maxlen=window_size)  # Arrival order, for eviction
+        self.sorted_window = []
+    
+    def filter(self, value):
+        window = self.sorted_window
+        if len(self.ring) == self.window_size:
+            del window[bisect_left(window, self.ring[0])]
+        self.ring.append(value)
+        insort(window, value)
+        
+        n = len(window)
+        if n < 3:
+            return value
+        
+        mid = n // 2
+        median = window[mid]
+        
+        # mid-th smallest |v - median|: walk outwards from the median,
+        # always taking the closer of the next lower / next upper value
+        lo = mid - 1
+        hi = mid
+        for _ in range(mid + 1):
+            if hi >= n or (lo >= 0 and median - window[lo] <= window[hi] - median):
+                mad = median - window[lo]
+                lo -= 1
+            else:
+                mad = window[hi] - median
+                hi += 1
         
         if mad > 1e-6:
             deviation = abs(value - median) / (1.4826 * mad)
@@ -164,35 +227,24 @@ class OptimizedHampelFilter:
         return value
 
 
-@pytest.fixture
-def turbulence_values(real_csi_data_available, real_baseline_packets, 
-                      real_movement_packets, default_subcarriers):
-    """Load turbulence values from real CSI data"""
-    if not real_csi_data_available:
-        # Fall back to synthetic data
-        np.random.seed(42)
-        baseline = list(np.random.normal(5.0, 0.5, 500))
-        movement = list(np.random.normal(10.0, 3.0, 500))
-        return baseline + movement
+@pytest.fixture(scope="module")
+def turbulence_values(_real_turbulence_array):
+    """
+    Turbulence trace from real CSI data as one contiguous float64 array.
     
-    values = []
-    for packet in real_baseline_packets:
-        turb = calculate_spatial_turbulence(
-            packet['csi_data'],
-            default_subcarriers,
-            gain_locked=packet.get('gain_locked', True)
-        )
-        values.append(float(turb))
-    
-    for packet in real_movement_packets:
-        turb = calculate_spatial_turbulence(
-            packet['csi_data'],
-            default_subcarriers,
-            gain_locked=packet.get('gain_locked', True)
-        )
-        values.append(float(turb))
+    Built once per module and shared read-only. Per-sample loops iterate
+    over .tolist() (plain Python floats, matching what the firmware-style
+    filters receive); vectorized references consume the array directly.
+    """
+    if _real_turbulence_array is None:
+        # Fall back to synthetic data
+        rng = np.random.default_rng(42)
+        values = np.concatenate([rng.normal(5.0, 0.5, 500), rng.normal(10.0, 3.0, 500)])
+        values.flags.writeable = False
+        return values
     
-    return values
+    # Precomputed once per session by conftest
+    return _real_turbulence_array
 
 
 class TestVarianceEquivalence:
@@ -203,167 +255,166 @@ class TestVarianceEquivalence:
         original = OriginalRunningVariance(WINDOW_SIZE)
         optimized = OptimizedTwoPassVariance(WINDOW_SIZE)
         
-        max_diff = 0.0
-        mismatches = []
+        out_orig = np.empty(len(turbulence_values))
+        out_opt = np.empty(len(turbulence_values))
         
-        for i, value in enumerate(turbulence_values):
-            orig_var = original.add(value)
-            opt_var = optimized.add(value)
-            
-            diff = abs(orig_var - opt_var)
-            max_diff = max(max_diff, diff)
-            
-            if diff > TOLERANCE and (orig_var > 0 or opt_var > 0):
-                mismatches.append({
-                    'index': i,
-                    'original': orig_var,
-                    'optimized': opt_var,
-                    'diff': diff
-                })
+        for i, value in enumerate(turbulence_values.tolist()):
+            out_orig[i] = original.add(value)
+            out_opt[i] = optimized.add(value)
         
-        assert len(mismatches) == 0, f"Found {len(mismatches)} mismatches, max_diff={max_diff}"
+        np.testing.assert_allclose(out_orig, out_opt, rtol=0, atol=TOLERANCE)
+        np.testing.assert_allclose(
+            out_opt, moving_variance_batch(turbulence_values, WINDOW_SIZE), rtol=0, atol=TOLERANCE
+        )
+
+
+def _run_hampel_pair(values):
+    """Filter values through original and optimized Hampel, returning both output traces"""
+    original = OriginalHampelFilter(HAMPEL_WINDOW, HAMPEL_THRESHOLD)
+    optimized = OptimizedHampelFilter(HAMPEL_WINDOW, HAMPEL_THRESHOLD)
+    out_orig = np.empty(len(values))
+    out_opt = np.empty(len(values))
+    for i, value in enumerate(values.tolist()):
+        out_orig[i] = original.filter(value)
+        out_opt[i] = optimized.filter(value)
+    return out_orig, out_opt
+
+
+@pytest.fixture(scope="module")
+def hampel_traces(turbulence_values):
+    """Original and optimized Hampel output traces, filtered once per module"""
+    return _run_hampel_pair(turbulence_values)
 
 
 class TestHampelEquivalence:
     """Test Hampel filter equivalence"""
     
-    def test_hampel_within_tolerance(self, turbulence_values):
+    def test_hampel_within_tolerance(self, hampel_traces):
         """Test that optimized Hampel produces same results"""
-        original = OriginalHampelFilter(HAMPEL_WINDOW, HAMPEL_THRESHOLD)
-        optimized = OptimizedHampelFilter(HAMPEL_WINDOW, HAMPEL_THRESHOLD)
-        
-        max_diff = 0.0
-        mismatches = []
-        
-        for i, value in enumerate(turbulence_values):
-            orig_filtered = original.filter(value)
-            opt_filtered = optimized.filter(value)
-            
-            diff = abs(orig_filtered - opt_filtered)
-            max_diff = max(max_diff, diff)
-            
-            if diff > TOLERANCE:
-                mismatches.append({
-                    'index': i,
-                    'input': value,
-                    'original': orig_filtered,
-                    'optimized': opt_filtered
-                })
-        
-        assert len(mismatches) == 0, f"Found {len(mismatches)} mismatches"
+        out_orig, out_opt = hampel_traces
+        
+        mismatches = np.flatnonzero(np.abs(out_orig - out_opt) > TOLERANCE)
+        assert mismatches.size == 0, (
+            f"Found {mismatches.size} mismatches (first at index {mismatches[:5].tolist()})"
+        )
     
-    def test_outlier_detection_count_matches(self, turbulence_values):
-        """Test that outlier detection counts match"""
+    def test_hampel_matches_vectorized_reference(self, turbulence_values, hampel_traces):
+        """Test the per-sample Hampel trace against one sliding-window NumPy pass"""
+        _, out_opt = hampel_traces
+        
+        reference = hampel_filter_batch(turbulence_values, HAMPEL_WINDOW, HAMPEL_THRESHOLD)
+        np.testing.assert_array_equal(out_opt, reference)
+    
+    def test_sorted_window_hampel_matches_original(self, turbulence_values):
+        """Test that the bisect-maintained sorted window Hampel is exact"""
         original = OriginalHampelFilter(HAMPEL_WINDOW, HAMPEL_THRESHOLD)
-        optimized = OptimizedHampelFilter(HAMPEL_WINDOW, HAMPEL_THRESHOLD)
+        sorted_window = SortedWindowHampelFilter(HAMPEL_WINDOW, HAMPEL_THRESHOLD)
+        
+        out_orig = np.array([original.filter(v) for v in turbulence_values.tolist()])
+        out_sorted = np.array([sorted_window.filter(v) for v in turbulence_values.tolist()])
+        
+        np.testing.assert_array_equal(out_sorted, out_orig)
+    
+    @pytest.mark.parametrize("window_size", [3, 4, 5, 8])
+    def test_sorted_window_hampel_window_sizes(self, window_size):
+        """Test odd/even windows with outliers and duplicate values"""
+        rng = np.random.default_rng(42)
+        values = np.round(rng.normal(10.0, 1.0, 300), 1)
+        values[::17] += 25.0
         
-        outliers_orig = 0
-        outliers_opt = 0
+        original = OriginalHampelFilter(window_size, HAMPEL_THRESHOLD)
+        sorted_window = SortedWindowHampelFilter(window_size, HAMPEL_THRESHOLD)
         
-        for value in turbulence_values:
-            orig_filtered = original.filter(value)
-            opt_filtered = optimized.filter(value)
-            
-            if orig_filtered != value:
-                outliers_orig += 1
-            if opt_filtered != value:
-                outliers_opt += 1
+        out_orig = np.array([original.filter(v) for v in values.tolist()])
+        out_sorted = np.array([sorted_window.filter(v) for v in values.tolist()])
         
+        np.testing.assert_array_equal(out_sorted, out_orig)
+    
+    def test_outlier_detection_count_matches(self, turbulence_values, hampel_traces):
+        """Test that outlier detection counts match"""
+        out_orig, out_opt = hampel_traces
+        
+        outliers_orig = np.count_nonzero(out_orig != turbulence_values)
+        outliers_opt = np.count_nonzero(out_opt != turbulence_values)
         assert outliers_orig == outliers_opt
 
 
+def _run_pipeline(hampel, variance, values):
+    """Run Hampel -> variance per sample in one fused loop, returning the variance trace"""
+    hampel_filter = hampel.filter
+    variance_add = variance.add
+    out = np.empty(len(values))
+    for i, value in enumerate(values.tolist()):
+        out[i] = variance_add(hampel_filter(value))
+    return out
+
+
+def _original_pipeline(values):
+    return _run_pipeline(
+        OriginalHampelFilter(HAMPEL_WINDOW, HAMPEL_THRESHOLD),
+        OriginalRunningVariance(WINDOW_SIZE),
+        values,
+    )
+
+
+def _optimized_pipeline(values):
+    return _run_pipeline(
+        OptimizedHampelFilter(HAMPEL_WINDOW, HAMPEL_THRESHOLD),
+        OptimizedTwoPassVariance(WINDOW_SIZE),
+        values,
+    )
+
+
+@pytest.fixture(scope="module")
+def pipeline_variances(turbulence_values):
+    """Original and optimized pipeline variance traces, computed once per module"""
+    return _original_pipeline(turbulence_values), _optimized_pipeline(turbulence_values)
+
+
 class TestFullPipelineEquivalence:
     """Test full pipeline: Hampel + Variance"""
     
-    def test_pipeline_variance_matches(self, turbulence_values):
+    def test_pipeline_variance_matches(self, pipeline_variances):
         """Test full pipeline produces identical variance"""
-        # Original pipeline
-        orig_hampel = OriginalHampelFilter(HAMPEL_WINDOW, HAMPEL_THRESHOLD)
-        orig_variance = OriginalRunningVariance(WINDOW_SIZE)
+        orig_var, opt_var = pipeline_variances
         
-        # Optimized pipeline
-        opt_hampel = OptimizedHampelFilter(HAMPEL_WINDOW, HAMPEL_THRESHOLD)
-        opt_variance = OptimizedTwoPassVariance(WINDOW_SIZE)
-        
-        max_diff = 0.0
-        mismatches = []
-        
-        for i, value in enumerate(turbulence_values):
-            orig_filtered = orig_hampel.filter(value)
-            orig_var = orig_variance.add(orig_filtered)
-            
-            opt_filtered = opt_hampel.filter(value)
-            opt_var = opt_variance.add(opt_filtered)
-            
-            diff = abs(orig_var - opt_var)
-            max_diff = max(max_diff, diff)
-            
-            if diff > TOLERANCE and (orig_var > 0 or opt_var > 0):
-                mismatches.append({'index': i, 'diff': diff})
+        np.testing.assert_allclose(orig_var, opt_var, rtol=0, atol=TOLERANCE)
+    
+    def test_pipeline_matches_vectorized_reference(self, turbulence_values, pipeline_variances):
+        """Test the per-sample pipeline against batch Hampel + moving variance"""
+        _, opt_var = pipeline_variances
         
-        assert len(mismatches) == 0
+        filtered = hampel_filter_batch(turbulence_values, HAMPEL_WINDOW, HAMPEL_THRESHOLD)
+        np.testing.assert_allclose(
+            opt_var, moving_variance_batch(filtered, WINDOW_SIZE), rtol=0, atol=TOLERANCE
+        )
 
 
 class TestMotionDetectionEquivalence:
     """Test motion detection state equivalence"""
     
-    def test_motion_states_match(self, turbulence_values):
+    def test_motion_states_match(self, turbulence_values, pipeline_variances):
         """Test that motion detection states match"""
         threshold = 1.0
+        orig_var, opt_var = pipeline_variances
         
-        # Original pipeline
-        orig_hampel = OriginalHampelFilter(HAMPEL_WINDOW, HAMPEL_THRESHOLD)
-        orig_variance = OriginalRunningVariance(WINDOW_SIZE)
-        
-        # Optimized pipeline
-        opt_hampel = OptimizedHampelFilter(HAMPEL_WINDOW, HAMPEL_THRESHOLD)
-        opt_variance = OptimizedTwoPassVariance(WINDOW_SIZE)
+        orig_motion = orig_var > threshold
+        opt_motion = opt_var > threshold
         
-        state_mismatches = 0
-        
-        for value in turbulence_values:
-            orig_filtered = orig_hampel.filter(value)
-            orig_var = orig_variance.add(orig_filtered)
-            orig_motion = orig_var > threshold
-            
-            opt_filtered = opt_hampel.filter(value)
-            opt_var = opt_variance.add(opt_filtered)
-            opt_motion = opt_var > threshold
-            
-            if orig_motion != opt_motion:
-                state_mismatches += 1
+        state_mismatches = np.count_nonzero(orig_motion != opt_motion)
         
         # Allow small number of mismatches at threshold boundary
         mismatch_rate = state_mismatches / len(turbulence_values) * 100
         assert mismatch_rate < 0.1, f"Mismatch rate: {mismatch_rate:.4f}%"
     
-    def test_motion_counts_match(self, turbulence_values):
+    def test_motion_counts_match(self, pipeline_variances):
         """Test that motion packet counts match"""
         threshold = 1.0
+        orig_var, opt_var = pipeline_variances
         
-        # Original pipeline
-        orig_hampel = OriginalHampelFilter(HAMPEL_WINDOW, HAMPEL_THRESHOLD)
-        orig_variance = OriginalRunningVariance(WINDOW_SIZE)
-        
-        # Optimized pipeline
-        opt_hampel = OptimizedHampelFilter(HAMPEL_WINDOW, HAMPEL_THRESHOLD)
-        opt_variance = OptimizedTwoPassVariance(WINDOW_SIZE)
-        
-        orig_motion_count = 0
-        opt_motion_count = 0
-        
-        for value in turbulence_values:
-            orig_filtered = orig_hampel.filter(value)
-            orig_var = orig_variance.add(orig_filtered)
-            if orig_var > threshold:
-                orig_motion_count += 1
-            
-            opt_filtered = opt_hampel.filter(value)
-            opt_var = opt_variance.add(opt_filtered)
-            if opt_var > threshold:
-                opt_motion_count += 1
+        orig_motion_count = np.count_nonzero(orig_var > threshold)
+        opt_motion_count = np.count_nonzero(opt_var > threshold)
         
         # Counts should be very close
         count_diff = abs(orig_motion_count - opt_motion_count)
         assert count_diff < 5  # Allow small difference
-
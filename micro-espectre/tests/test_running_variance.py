@@ -10,16 +10,22 @@ License: GPLv3
 
 import pytest
 import math
+import time
 import numpy as np
-from csi_utils import calculate_variance_two_pass, calculate_spatial_turbulence
+from collections import deque
+from csi_utils import calculate_variance_two_pass, moving_variance_batch
 
 
 class RunningVariance:
     """
     Welford's online algorithm for running variance on a sliding window.
     
-    Maintains a circular buffer and calculates variance incrementally
-    when a new value is added and an old value is removed.
+    Maintains a circular buffer plus the window mean and M2 (sum of squared
+    deviations from the mean). While filling, each value is a standard
+    Welford update; once full, the evicted and incoming values are applied
+    as one add/remove pair (West 1979). Both accumulators carry a Kahan
+    compensation term so large values passing through the window do not
+    leave a residue once they have been evicted.
     
     Time complexity: O(1) per update (vs O(N) for two-pass)
     """
@@ -29,48 +35,57 @@ class RunningVariance:
         self.buffer = [0.0] * window_size
         self.buffer_index = 0
         self.count = 0
-        self.sum = 0.0
-        self.sum_sq = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self._c_mean = 0.0
+        self._c_m2 = 0.0
+        self._variance = 0.0
     
     def add(self, value):
         """Add a new value to the window"""
+        old_mean = self.mean
         if self.count < self.window_size:
-            self.buffer[self.buffer_index] = value
-            self.sum += value
-            self.sum_sq += value * value
+            # Filling: plain Welford update
             self.count += 1
+            self._add_mean((value - old_mean) / self.count)
+            self._add_m2((value - self.mean) * (value - old_mean))
         else:
+            # Full: evict the oldest value and add the new one in one step
             old_value = self.buffer[self.buffer_index]
-            self.sum -= old_value
-            self.sum_sq -= old_value * old_value
-            self.buffer[self.buffer_index] = value
-            self.sum += value
-            self.sum_sq += value * value
+            delta = value - old_value
+            self._add_mean(delta / self.count)
+            self._add_m2(delta * (value - self.mean + old_value - old_mean))
         
+        self.buffer[self.buffer_index] = value
         self.buffer_index = (self.buffer_index + 1) % self.window_size
+        # Callers query after every add, so settle the variance here once
+        self._variance = max(0.0, self.m2 / self.count)
+    
+    def _add_mean(self, increment):
+        """Kahan-compensated mean += increment"""
+        y = increment - self._c_mean
+        t = self.mean + y
+        self._c_mean = (t - self.mean) - y
+        self.mean = t
+    
+    def _add_m2(self, increment):
+        """Kahan-compensated m2 += increment"""
+        y = increment - self._c_m2
+        t = self.m2 + y
+        self._c_m2 = (t - self.m2) - y
+        self.m2 = t
     
     def get_variance(self):
-        """Calculate variance from running sums: Var(X) = E[X²] - E[X]²"""
-        if self.count == 0:
-            return 0.0
-        
-        n = self.count
-        mean = self.sum / n
-        mean_sq = self.sum_sq / n
-        variance = mean_sq - mean * mean
-        return max(0.0, variance)
+        """Population variance M2 / n as of the last add (clamped at zero)"""
+        return self._variance
     
     def get_values(self):
         """Get current buffer values"""
         if self.count < self.window_size:
             return self.buffer[:self.count]
-        else:
-            result = []
-            idx = self.buffer_index
-            for _ in range(self.window_size):
-                result.append(self.buffer[idx])
-                idx = (idx + 1) % self.window_size
-            return result
+        # Oldest value sits at buffer_index: unroll the ring with two slices
+        i = self.buffer_index
+        return self.buffer[i:] + self.buffer[:i]
 
 
 class TwoPassVariance:
@@ -78,16 +93,17 @@ class TwoPassVariance:
     
     def __init__(self, window_size):
         self.window_size = window_size
-        self.buffer = []
+        # maxlen evicts the oldest value in O(1) (list.pop(0) is O(W))
+        self.buffer = deque(maxlen=window_size)
     
     def add(self, value):
         """Add a new value to the window"""
         self.buffer.append(value)
-        if len(self.buffer) > self.window_size:
-            self.buffer.pop(0)
     
     def get_variance(self):
         """Calculate variance using two-pass algorithm"""
+        # calculate_variance only needs len() and iteration, so the deque
+        # is passed as-is without materializing a list
         return calculate_variance_two_pass(self.buffer)
     
     def get_values(self):
@@ -95,6 +111,30 @@ class TwoPassVariance:
         return list(self.buffer)
 
 
+def _run_both(values, window_size):
+    """Drive both implementations per sample, returning their variance traces"""
+    two_pass = TwoPassVariance(window_size)
+    running = RunningVariance(window_size)
+    out_tp = np.empty(len(values))
+    out_run = np.empty(len(values))
+    for i, value in enumerate(values):
+        two_pass.add(value)
+        running.add(value)
+        out_tp[i] = two_pass.get_variance()
+        out_run[i] = running.get_variance()
+    return out_tp, out_run
+
+
+def _assert_equivalent(values, window_size):
+    """Running matches two-pass on every sample, and NumPy on full windows"""
+    out_tp, out_run = _run_both(values, window_size)
+    np.testing.assert_allclose(out_run, out_tp, rtol=0, atol=1e-6)
+    reference = moving_variance_batch(values, window_size)
+    np.testing.assert_allclose(
+        out_run[window_size - 1:], reference[window_size - 1:], rtol=0, atol=1e-6
+    )
+
+
 class TestSyntheticData:
     """Test with synthetic data patterns"""
     
@@ -104,155 +144,48 @@ class TestSyntheticData:
     
     def test_constant_values(self, window_size, constant_values):
         """Test with constant values"""
-        two_pass = TwoPassVariance(window_size)
-        running = RunningVariance(window_size)
-        
-        max_diff = 0.0
-        for value in constant_values:
-            two_pass.add(value)
-            running.add(value)
-            diff = abs(two_pass.get_variance() - running.get_variance())
-            max_diff = max(max_diff, diff)
-        
-        assert max_diff < 1e-6
+        _assert_equivalent(constant_values, window_size)
     
     def test_linear_ramp(self, window_size, linear_ramp):
         """Test with linear ramp"""
-        two_pass = TwoPassVariance(window_size)
-        running = RunningVariance(window_size)
-        
-        max_diff = 0.0
-        for value in linear_ramp:
-            two_pass.add(value)
-            running.add(value)
-            diff = abs(two_pass.get_variance() - running.get_variance())
-            max_diff = max(max_diff, diff)
-        
-        assert max_diff < 1e-6
+        _assert_equivalent(linear_ramp, window_size)
     
     def test_sine_wave(self, window_size, sine_wave):
         """Test with sine wave"""
-        two_pass = TwoPassVariance(window_size)
-        running = RunningVariance(window_size)
-        
-        max_diff = 0.0
-        for value in sine_wave:
-            two_pass.add(value)
-            running.add(value)
-            diff = abs(two_pass.get_variance() - running.get_variance())
-            max_diff = max(max_diff, diff)
-        
-        assert max_diff < 1e-6
+        _assert_equivalent(sine_wave, window_size)
     
     def test_random_uniform(self, window_size, random_uniform):
         """Test with random uniform distribution"""
-        two_pass = TwoPassVariance(window_size)
-        running = RunningVariance(window_size)
-        
-        max_diff = 0.0
-        for value in random_uniform:
-            two_pass.add(value)
-            running.add(value)
-            diff = abs(two_pass.get_variance() - running.get_variance())
-            max_diff = max(max_diff, diff)
-        
-        assert max_diff < 1e-6
+        _assert_equivalent(random_uniform, window_size)
     
     def test_random_normal(self, window_size, random_normal):
         """Test with random normal distribution"""
-        two_pass = TwoPassVariance(window_size)
-        running = RunningVariance(window_size)
-        
-        max_diff = 0.0
-        for value in random_normal:
-            two_pass.add(value)
-            running.add(value)
-            diff = abs(two_pass.get_variance() - running.get_variance())
-            max_diff = max(max_diff, diff)
-        
-        assert max_diff < 1e-6
+        _assert_equivalent(random_normal, window_size)
     
     def test_step_function(self, window_size, step_function):
         """Test with step function"""
-        two_pass = TwoPassVariance(window_size)
-        running = RunningVariance(window_size)
-        
-        max_diff = 0.0
-        for value in step_function:
-            two_pass.add(value)
-            running.add(value)
-            diff = abs(two_pass.get_variance() - running.get_variance())
-            max_diff = max(max_diff, diff)
-        
-        assert max_diff < 1e-6
+        _assert_equivalent(step_function, window_size)
     
     def test_impulse(self, window_size, impulse_data):
         """Test with impulse/spike data"""
-        two_pass = TwoPassVariance(window_size)
-        running = RunningVariance(window_size)
-        
-        max_diff = 0.0
-        for value in impulse_data:
-            two_pass.add(value)
-            running.add(value)
-            diff = abs(two_pass.get_variance() - running.get_variance())
-            max_diff = max(max_diff, diff)
-        
-        assert max_diff < 1e-6
+        _assert_equivalent(impulse_data, window_size)
 
 
 class TestRealCSIData:
     """Test with real CSI data (skip if not available)"""
     
-    def test_real_csi_variance_equivalence(self, real_csi_data_available, 
-                                            real_baseline_packets, 
-                                            real_movement_packets,
-                                            default_subcarriers):
+    def test_real_csi_variance_equivalence(self, real_turbulence_values):
         """Test variance equivalence on real CSI data"""
-        if not real_csi_data_available:
-            pytest.skip("Real CSI data not available")
-        
-        window_size = 100
-        all_packets = real_baseline_packets + real_movement_packets
-        
-        two_pass = TwoPassVariance(window_size)
-        running = RunningVariance(window_size)
-        
-        max_diff = 0.0
-        
-        for pkt in all_packets:
-            turb = calculate_spatial_turbulence(
-                pkt['csi_data'],
-                default_subcarriers,
-                gain_locked=pkt.get('gain_locked', True)
-            )
-            two_pass.add(turb)
-            running.add(turb)
-            diff = abs(two_pass.get_variance() - running.get_variance())
-            max_diff = max(max_diff, diff)
-        
-        assert max_diff < 1e-6
+        _assert_equivalent(real_turbulence_values, window_size=100)
     
-    def test_buffer_contents_match(self, real_csi_data_available,
-                                    real_baseline_packets,
-                                    real_movement_packets,
-                                    default_subcarriers):
+    def test_buffer_contents_match(self, real_turbulence_values):
         """Test that buffer contents match at the end"""
-        if not real_csi_data_available:
-            pytest.skip("Real CSI data not available")
-        
         window_size = 100
-        all_packets = real_baseline_packets + real_movement_packets
         
         two_pass = TwoPassVariance(window_size)
         running = RunningVariance(window_size)
         
-        for pkt in all_packets:
-            turb = calculate_spatial_turbulence(
-                pkt['csi_data'],
-                default_subcarriers,
-                gain_locked=pkt.get('gain_locked', True)
-            )
+        for turb in real_turbulence_values:
             two_pass.add(turb)
             running.add(turb)
         
@@ -267,38 +200,13 @@ class TestRealCSIData:
 class TestDetectionEquivalence:
     """Test that both methods produce identical detection results"""
     
-    def test_state_machine_equivalence(self, real_csi_data_available,
-                                        real_baseline_packets,
-                                        real_movement_packets,
-                                        default_subcarriers):
+    def test_state_machine_equivalence(self, real_turbulence_values):
         """Test that state transitions are identical"""
-        if not real_csi_data_available:
-            pytest.skip("Real CSI data not available")
-        
-        window_size = 100
         threshold = 0.5
-        all_packets = real_baseline_packets + real_movement_packets
-        
-        two_pass = TwoPassVariance(window_size)
-        running = RunningVariance(window_size)
         
-        state_mismatches = 0
-        
-        for pkt in all_packets:
-            turb = calculate_spatial_turbulence(
-                pkt['csi_data'],
-                default_subcarriers,
-                gain_locked=pkt.get('gain_locked', True)
-            )
-            two_pass.add(turb)
-            running.add(turb)
-            
-            state_tp = 'MOTION' if two_pass.get_variance() > threshold else 'IDLE'
-            state_run = 'MOTION' if running.get_variance() > threshold else 'IDLE'
-            
-            if state_tp != state_run:
-                state_mismatches += 1
+        out_tp, out_run = _run_both(real_turbulence_values, window_size=100)
         
+        state_mismatches = np.count_nonzero((out_tp > threshold) != (out_run > threshold))
         assert state_mismatches == 0
 
 
@@ -339,16 +247,15 @@ class TestNumericalStability:
         """Test with mixed scale values"""
         data = [1e-5] * 100 + [1e5] * 100 + [1e-5] * 300
         
-        two_pass = TwoPassVariance(window_size)
-        running = RunningVariance(window_size)
+        out_tp, out_run = _run_both(data, window_size)
         
-        for value in data:
-            two_pass.add(value)
-            running.add(value)
-            
-            # Running variance might have numerical issues here
-            # but should still be finite
-            assert math.isfinite(running.get_variance())
+        # While 1e5 values are in the window, rounding is relative to x² ~ 1e10
+        large = slice(100, 200 + window_size - 1)
+        np.testing.assert_allclose(out_run[large], out_tp[large], rtol=1e-9, atol=1e-5)
+        
+        # Before they arrive and once they are evicted, nothing may be left over
+        np.testing.assert_allclose(out_run[:100], out_tp[:100], rtol=0, atol=1e-6)
+        np.testing.assert_allclose(out_run[large.stop:], out_tp[large.stop:], rtol=0, atol=1e-6)
     
     def test_near_constant(self, window_size):
         """Test with near-constant values"""
@@ -365,36 +272,41 @@ class TestNumericalStability:
             assert running.get_variance() >= 0
 
 
+def _best_time(func, repeat=5):
+    """Best-of-N wall time for func(), after one untimed warm-up call"""
+    func()
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _drive(variance_cls, window_size, data):
+    """Feed data through a fresh variance tracker, querying after every add"""
+    tracker = variance_cls(window_size)
+    for value in data:
+        tracker.add(value)
+        tracker.get_variance()
+
+
 class TestPerformance:
     """Performance comparison tests"""
     
     def test_running_faster_than_two_pass(self):
         """Verify running variance is faster than two-pass"""
-        import time
-        
         window_size = 100
-        num_values = 10000
-        np.random.seed(42)
-        data = list(np.random.normal(50, 15, num_values))
+        # 20 windows of steady state are plenty to separate O(1) from O(N)
+        num_values = 2000
+        data = np.random.default_rng(42).normal(50, 15, num_values).tolist()
         
-        # Two-pass timing
-        two_pass = TwoPassVariance(window_size)
-        start = time.perf_counter()
-        for value in data:
-            two_pass.add(value)
-            _ = two_pass.get_variance()
-        time_tp = time.perf_counter() - start
-        
-        # Running variance timing
-        running = RunningVariance(window_size)
-        start = time.perf_counter()
-        for value in data:
-            running.add(value)
-            _ = running.get_variance()
-        time_run = time.perf_counter() - start
+        # Data generation stays outside the timed region; best-of-N damps
+        # scheduler noise that a single run is exposed to
+        time_tp = _best_time(lambda: _drive(TwoPassVariance, window_size, data))
+        time_run = _best_time(lambda: _drive(RunningVariance, window_size, data))
         
         # Running should be faster (O(1) vs O(N))
         # Allow some margin for test environment variability
         speedup = time_tp / time_run
         assert speedup > 1.0  # At least not slower
-
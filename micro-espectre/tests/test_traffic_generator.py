@@ -10,35 +10,50 @@ License: GPLv3
 
 import pytest
 import sys
+import time
 from pathlib import Path
-from unittest.mock import MagicMock, patch, PropertyMock
+from unittest.mock import MagicMock
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
 
-# Mock MicroPython modules before importing
-mock_network = MagicMock()
-mock_network.WLAN = MagicMock()
-mock_network.STA_IF = 0
-sys.modules['network'] = mock_network
+# Mock MicroPython modules before importing (tests get fresh `network` and
+# `_thread` mocks from the mock_network / mock_thread fixtures)
+sys.modules['network'] = MagicMock(STA_IF=0)
+sys.modules['_thread'] = MagicMock()
 
-mock_thread = MagicMock()
-sys.modules['_thread'] = mock_thread
+# MicroPython time functions (ticks_ms, sleep_ms, ...) are added in conftest.py
+import traffic_generator
+from traffic_generator import TrafficGenerator, TRAFFIC_RATE_MIN, TRAFFIC_RATE_MAX
 
-# Add MicroPython-specific time functions to time module for testing
-import time
-if not hasattr(time, 'ticks_ms'):
-    time.ticks_ms = lambda: int(time.time() * 1000)
-if not hasattr(time, 'ticks_us'):
-    time.ticks_us = lambda: int(time.time() * 1000000)
-if not hasattr(time, 'ticks_diff'):
-    time.ticks_diff = lambda t1, t2: t1 - t2
-if not hasattr(time, 'sleep_ms'):
-    time.sleep_ms = lambda ms: time.sleep(ms / 1000)
-if not hasattr(time, 'sleep_us'):
-    time.sleep_us = lambda us: time.sleep(us / 1000000)
 
-from traffic_generator import TrafficGenerator, TRAFFIC_RATE_MIN, TRAFFIC_RATE_MAX
+@pytest.fixture(autouse=True)
+def mock_network(monkeypatch):
+    """Install a fresh `network` mock for each test so WLAN setup cannot leak"""
+    network = MagicMock(STA_IF=0)
+    monkeypatch.setitem(sys.modules, 'network', network)
+    monkeypatch.setattr(traffic_generator, 'network', network)
+    return network
+
+
+@pytest.fixture(autouse=True)
+def mock_thread(monkeypatch):
+    """Install a fresh `_thread` mock for each test so start() never spawns a thread"""
+    thread = MagicMock()
+    monkeypatch.setitem(sys.modules, '_thread', thread)
+    monkeypatch.setattr(traffic_generator, '_thread', thread)
+    return thread
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    """Make time.sleep/sleep_ms/sleep_us no-ops (stop() and the DNS loop pace with them).
+    
+    ticks_ms/ticks_us stay real so the rate and loop-time math still runs.
+    """
+    monkeypatch.setattr(time, 'sleep', lambda s: None)
+    monkeypatch.setattr(time, 'sleep_ms', lambda ms: None)
+    monkeypatch.setattr(time, 'sleep_us', lambda us: None)
 
 
 @pytest.fixture
@@ -47,13 +62,18 @@ def traffic_gen():
     return TrafficGenerator()
 
 
+# Mock configurations are built once; each test gets a fresh MagicMock from
+# them (a shallow copy of a configured mock would share its child mocks).
+_WLAN_CONFIG = {
+    'isconnected.return_value': True,
+    'ifconfig.return_value': ('192.168.1.100', '255.255.255.0', '192.168.1.1', '8.8.8.8'),
+}
+
+
 @pytest.fixture
 def mock_wlan():
     """Create mock WLAN interface"""
-    wlan = MagicMock()
-    wlan.isconnected.return_value = True
-    wlan.ifconfig.return_value = ('192.168.1.100', '255.255.255.0', '192.168.1.1', '8.8.8.8')
-    return wlan
+    return MagicMock(**_WLAN_CONFIG)
 
 
 class TestTrafficGeneratorInit:
@@ -116,7 +136,7 @@ class TestTrafficGeneratorGetters:
 class TestTrafficGeneratorGetGatewayIP:
     """Test _get_gateway_ip method"""
     
-    def test_get_gateway_ip_success(self, traffic_gen, mock_wlan):
+    def test_get_gateway_ip_success(self, traffic_gen, mock_wlan, mock_network):
         """Test getting gateway IP successfully"""
         mock_network.WLAN.return_value = mock_wlan
         
@@ -124,7 +144,7 @@ class TestTrafficGeneratorGetGatewayIP:
         
         assert result == '192.168.1.1'
     
-    def test_get_gateway_ip_not_connected(self, traffic_gen):
+    def test_get_gateway_ip_not_connected(self, traffic_gen, mock_network):
         """Test getting gateway IP when not connected"""
         mock_wlan = MagicMock()
         mock_wlan.isconnected.return_value = False
@@ -134,7 +154,7 @@ class TestTrafficGeneratorGetGatewayIP:
         
         assert result is None
     
-    def test_get_gateway_ip_short_ifconfig(self, traffic_gen):
+    def test_get_gateway_ip_short_ifconfig(self, traffic_gen, mock_network):
         """Test getting gateway IP with short ifconfig response"""
         mock_wlan = MagicMock()
         mock_wlan.isconnected.return_value = True
@@ -145,16 +165,13 @@ class TestTrafficGeneratorGetGatewayIP:
         
         assert result is None
     
-    def test_get_gateway_ip_exception(self, traffic_gen):
+    def test_get_gateway_ip_exception(self, traffic_gen, mock_network):
         """Test getting gateway IP when exception occurs"""
         mock_network.WLAN.side_effect = Exception("Network error")
         
         result = traffic_gen._get_gateway_ip()
         
         assert result is None
-        
-        # Reset mock
-        mock_network.WLAN.side_effect = None
 
 
 class TestTrafficGeneratorStart:
@@ -180,7 +197,7 @@ class TestTrafficGeneratorStart:
         
         assert result is False
     
-    def test_start_no_gateway_ip(self, traffic_gen):
+    def test_start_no_gateway_ip(self, traffic_gen, mock_network):
         """Test start when gateway IP cannot be obtained"""
         mock_wlan = MagicMock()
         mock_wlan.isconnected.return_value = False
@@ -191,10 +208,9 @@ class TestTrafficGeneratorStart:
         assert result is False
         assert traffic_gen.running is False
     
-    def test_start_success(self, traffic_gen, mock_wlan):
+    def test_start_success(self, traffic_gen, mock_wlan, mock_network, mock_thread):
         """Test successful start"""
         mock_network.WLAN.return_value = mock_wlan
-        mock_thread.start_new_thread = MagicMock()
         
         result = traffic_gen.start(100)
         
@@ -207,10 +223,10 @@ class TestTrafficGeneratorStart:
         # Cleanup
         traffic_gen.running = False
     
-    def test_start_thread_exception(self, traffic_gen, mock_wlan):
+    def test_start_thread_exception(self, traffic_gen, mock_wlan, mock_network, mock_thread):
         """Test start when thread creation fails"""
         mock_network.WLAN.return_value = mock_wlan
-        mock_thread.start_new_thread = MagicMock(side_effect=Exception("Thread error"))
+        mock_thread.start_new_thread.side_effect = Exception("Thread error")
         
         result = traffic_gen.start(100)
         
@@ -256,21 +272,23 @@ class TestTrafficGeneratorConstants:
 class TestTrafficGeneratorDnsTask:
     """Test _dns_task method (partial coverage due to MicroPython dependencies)"""
     
-    def test_dns_task_socket_creation_failure(self, traffic_gen):
+    def test_dns_task_socket_creation_failure(self, traffic_gen, monkeypatch):
         """Test DNS task handles socket creation failure"""
         traffic_gen.running = True
         traffic_gen.rate_pps = 100
         traffic_gen.gateway_ip = '192.168.1.1'
         
         # Mock socket to fail on creation
-        with patch('traffic_generator.socket.socket') as mock_socket:
-            mock_socket.side_effect = Exception("Socket error")
-            
-            traffic_gen._dns_task()
-            
-            assert traffic_gen.running is False
+        def fail_socket(*args, **kwargs):
+            raise Exception("Socket error")
+        
+        monkeypatch.setattr('traffic_generator.socket.socket', fail_socket)
+        
+        traffic_gen._dns_task()
+        
+        assert traffic_gen.running is False
     
-    def test_dns_task_runs_and_stops(self, traffic_gen, mock_wlan):
+    def test_dns_task_runs_and_stops(self, traffic_gen, mock_wlan, mock_network, monkeypatch):
         """Test DNS task runs and stops correctly"""
         mock_network.WLAN.return_value = mock_wlan
         traffic_gen.rate_pps = 100
@@ -279,9 +297,6 @@ class TestTrafficGeneratorDnsTask:
         
         # Mock socket
         mock_sock = MagicMock()
-        mock_sock.setblocking = MagicMock()
-        mock_sock.sendto = MagicMock()
-        mock_sock.close = MagicMock()
         
         packets_sent = [0]
         
@@ -292,21 +307,20 @@ class TestTrafficGeneratorDnsTask:
         
         mock_sock.sendto.side_effect = send_and_stop
         
-        with patch('traffic_generator.socket.socket', return_value=mock_sock):
-            traffic_gen._dns_task()
+        monkeypatch.setattr('traffic_generator.socket.socket', lambda *a, **k: mock_sock)
+        traffic_gen._dns_task()
         
-        assert mock_sock.sendto.call_count >= 1
+        # Sleeps are stubbed, so each loop iteration sends exactly once
+        assert mock_sock.sendto.call_count == 3
         mock_sock.close.assert_called_once()
     
-    def test_dns_task_socket_error(self, traffic_gen):
+    def test_dns_task_socket_error(self, traffic_gen, monkeypatch):
         """Test DNS task handles socket send errors"""
         traffic_gen.rate_pps = 100
         traffic_gen.gateway_ip = '192.168.1.1'
         traffic_gen.running = True
         
         mock_sock = MagicMock()
-        mock_sock.setblocking = MagicMock()
-        mock_sock.close = MagicMock()
         
         error_count = [0]
         
@@ -318,20 +332,18 @@ class TestTrafficGeneratorDnsTask:
         
         mock_sock.sendto.side_effect = send_with_error
         
-        with patch('traffic_generator.socket.socket', return_value=mock_sock):
-            traffic_gen._dns_task()
+        monkeypatch.setattr('traffic_generator.socket.socket', lambda *a, **k: mock_sock)
+        traffic_gen._dns_task()
         
-        assert traffic_gen.error_count >= 1
+        assert traffic_gen.error_count == 3
     
-    def test_dns_task_general_exception(self, traffic_gen):
+    def test_dns_task_general_exception(self, traffic_gen, monkeypatch):
         """Test DNS task handles general exceptions"""
         traffic_gen.rate_pps = 100
         traffic_gen.gateway_ip = '192.168.1.1'
         traffic_gen.running = True
         
         mock_sock = MagicMock()
-        mock_sock.setblocking = MagicMock()
-        mock_sock.close = MagicMock()
         
         exception_count = [0]
         
@@ -343,8 +355,8 @@ class TestTrafficGeneratorDnsTask:
         
         mock_sock.sendto.side_effect = send_with_exception
         
-        with patch('traffic_generator.socket.socket', return_value=mock_sock):
-            traffic_gen._dns_task()
+        monkeypatch.setattr('traffic_generator.socket.socket', lambda *a, **k: mock_sock)
+        traffic_gen._dns_task()
         
-        assert traffic_gen.error_count >= 1
+        assert traffic_gen.error_count == 3
 
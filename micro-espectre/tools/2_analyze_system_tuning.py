@@ -20,7 +20,7 @@ import argparse
 # Import csi_utils first - it sets up paths automatically
 from csi_utils import (
     load_npz_as_packets, test_mvs_configuration, MVSDetector,
-    find_dataset
+    find_dataset, mvs_turbulence_batch, moving_variance_batch, stack_packets
 )
 from config import (
     DEFAULT_SUBCARRIERS,
@@ -118,6 +118,8 @@ def test_contiguous_clusters(baseline_packets, movement_packets, num_sc, cluster
     results = []
     baseline_count = len(baseline_packets)
     movement_count = len(movement_packets)
+    # Stack once (contiguous int8 matrix), then every band is one NumPy pass
+    csi_matrix, gain_locked = stack_packets(list(baseline_packets) + list(movement_packets))
     valid_subcarriers = get_valid_subcarriers(num_sc)
     total_tests = max(0, (len(valid_subcarriers) - cluster_size + 1) * len(thresholds) * len(window_sizes))
     test_count = 0
@@ -127,12 +129,16 @@ def test_contiguous_clusters(baseline_packets, movement_packets, num_sc, cluster
     
     for start_idx in range(0, len(valid_subcarriers) - cluster_size + 1):
         cluster = valid_subcarriers[start_idx:start_idx + cluster_size]
+        # Turbulence depends only on the band and the moving variance only on
+        # the window: compute each once, then each threshold is a comparison
+        turbulence = mvs_turbulence_batch(csi_matrix, cluster, gain_locked)
         
         for window_size in window_sizes:
+            moving_variance = moving_variance_batch(turbulence, window_size)
             for threshold in thresholds:
                 fp, tp, score = test_mvs_configuration(
                     baseline_packets, movement_packets, 
-                    cluster, threshold, window_size
+                    cluster, threshold, window_size, moving_variance=moving_variance
                 )
                 
                 result = _build_result_entry({
@@ -184,6 +190,8 @@ def test_dual_clusters(baseline_packets, movement_packets, num_sc, quick=False):
     results = []
     baseline_count = len(baseline_packets)
     movement_count = len(movement_packets)
+    # Stack once (contiguous int8 matrix), then every band is one NumPy pass
+    csi_matrix, gain_locked = stack_packets(list(baseline_packets) + list(movement_packets))
     valid_subcarriers = get_valid_subcarriers(num_sc)
     valid_min = valid_subcarriers[0]
     valid_max = valid_subcarriers[-1]
@@ -231,12 +239,14 @@ def test_dual_clusters(baseline_packets, movement_packets, num_sc, quick=False):
     
     for cluster1, cluster2 in cluster_configs:
         combined_cluster = cluster1 + cluster2
+        turbulence = mvs_turbulence_batch(csi_matrix, combined_cluster, gain_locked)
         
         for window_size in window_sizes:
+            moving_variance = moving_variance_batch(turbulence, window_size)
             for threshold in thresholds:
                 fp, tp, score = test_mvs_configuration(
                     baseline_packets, movement_packets,
-                    combined_cluster, threshold, window_size
+                    combined_cluster, threshold, window_size, moving_variance=moving_variance
                 )
                 
                 result = _build_result_entry({
@@ -272,6 +282,8 @@ def test_sparse_configurations(baseline_packets, movement_packets, num_sc, quick
     results = []
     baseline_count = len(baseline_packets)
     movement_count = len(movement_packets)
+    # Stack once (contiguous int8 matrix), then every band is one NumPy pass
+    csi_matrix, gain_locked = stack_packets(list(baseline_packets) + list(movement_packets))
     configs = []
     valid_subcarriers = get_valid_subcarriers(num_sc)
     valid_min = valid_subcarriers[0]
@@ -359,11 +371,14 @@ def test_sparse_configurations(baseline_packets, movement_packets, num_sc, quick
     print(f"Progress: ", end='', flush=True)
     
     for config_type, label, subcarriers in configs:
+        turbulence = mvs_turbulence_batch(csi_matrix, subcarriers, gain_locked)
+        
         for window_size in window_sizes:
+            moving_variance = moving_variance_batch(turbulence, window_size)
             for threshold in thresholds:
                 fp, tp, score = test_mvs_configuration(
                     baseline_packets, movement_packets,
-                    subcarriers, threshold, window_size
+                    subcarriers, threshold, window_size, moving_variance=moving_variance
                 )
                 
                 result = _build_result_entry({
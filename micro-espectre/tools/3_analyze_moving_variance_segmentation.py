@@ -97,22 +97,20 @@ def select_subcarriers_nbvi(baseline_packets):
     """
     import tempfile
     from pathlib import Path
-    import nbvi_calibrator
     from threshold import calculate_adaptive_threshold
     
-    # Patch buffer file path to use temp directory
-    original_buffer_file = nbvi_calibrator.BUFFER_FILE
+    # Buffer file in the temp directory instead of the device path
     with tempfile.NamedTemporaryFile(
         mode='wb',
         suffix='_nbvi_buffer.bin',
         delete=False
     ) as tmp_file:
         temp_buffer = tmp_file.name
-    nbvi_calibrator.BUFFER_FILE = temp_buffer
     
     try:
         calibrator = NBVICalibrator(
-            buffer_size=len(baseline_packets)
+            buffer_size=len(baseline_packets),
+            buffer_file=temp_buffer
         )
         
         # Feed all baseline packets to calibrator
@@ -136,8 +134,6 @@ def select_subcarriers_nbvi(baseline_packets):
         
         return band, adaptive_threshold, calibration_time_ms
     finally:
-        # Restore original path
-        nbvi_calibrator.BUFFER_FILE = original_buffer_file
         temp_path = Path(temp_buffer)
         if temp_path.exists():
             temp_path.unlink()
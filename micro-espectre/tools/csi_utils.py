@@ -5,7 +5,8 @@ Provides:
   - UDP reception (CSIReceiver)
   - Data collection (CSICollector)
   - Dataset management (load, save, stats)
-  - MVS detection (MVSDetector)
+  - MVS detection (MVSDetector, vectorized run_mvs_batch / hampel_filter_batch
+    for offline replay)
   - Path setup for all tools (setup_paths)
 
 Author: Francesco Pace <francesco.pace@gmail.com>
@@ -1400,6 +1401,246 @@ def calculate_variance_two_pass(values) -> float:
     return SegmentationContext.compute_variance_two_pass(values)
 
 
+def calculate_spatial_turbulence_batch(csi_matrix, selected_subcarriers,
+                                       gain_locked: bool = True) -> np.ndarray:
+    """
+    Vectorized spatial turbulence for a whole packet sequence (offline replay)
+    
+    Same result as calling calculate_spatial_turbulence() on every row, but
+    computed with one NumPy pass over the (P, 2*S) I/Q matrix.
+    
+    Args:
+        csi_matrix: (P, 2*S) array of I/Q pairs per packet (int8, or uint8 raw bytes)
+        selected_subcarriers: List of subcarrier indices to use
+        gain_locked: True if AGC gain lock was active (raw std), False for CV normalization
+    
+    Returns:
+        np.ndarray: Turbulence per packet, shape (P,)
+    """
+    csi = np.asarray(csi_matrix)
+    if csi.dtype == np.uint8:
+        csi = csi.view(np.int8)
+    csi = csi.reshape(len(csi), -1)
+    
+    # Same bounds rule as compute_spatial_turbulence (drop out-of-range indices)
+    sc = np.array([s for s in selected_subcarriers if 2 * s + 1 < csi.shape[1]], dtype=np.intp)
+    if len(sc) < 2:
+        return np.zeros(len(csi))
+    
+    # Espressif CSI format: [Imaginary, Real, ...] per subcarrier
+    imag = csi[:, 2 * sc].astype(np.float64)
+    real = csi[:, 2 * sc + 1].astype(np.float64)
+    amplitudes = np.sqrt(real * real + imag * imag)
+    
+    std = amplitudes.std(axis=1)
+    if gain_locked:
+        return std
+    mean = amplitudes.mean(axis=1)
+    return np.divide(std, mean, out=np.zeros_like(std), where=mean > 0)
+
+
+def hampel_filter_batch(values, window_size: int = config.HAMPEL_WINDOW,
+                        threshold: float = config.HAMPEL_THRESHOLD) -> np.ndarray:
+    """
+    Vectorized Hampel filter for a whole turbulence sequence (offline replay)
+    
+    Same output as feeding the values one by one to a fresh HampelFilter:
+    causal trailing window, upper-middle median, first two samples passed
+    through, outliers replaced only when MAD > 1e-6.
+    
+    Args:
+        values: 1-D sequence of turbulence values
+        window_size: Hampel window size
+        threshold: Outlier threshold in MAD units
+    
+    Returns:
+        np.ndarray: Filtered values, shape (N,)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    filtered = values.copy()
+    scaled_threshold = threshold * 1.4826
+    
+    def apply(windows, last):
+        # Median/MAD of each row, then the same outlier test as HampelFilter.filter()
+        mid = windows.shape[1] >> 1
+        current = values[last]
+        median = np.partition(windows, mid, axis=1)[:, mid]
+        mad = np.partition(np.abs(windows - median[:, None]), mid, axis=1)[:, mid]
+        valid = mad > 1e-6
+        deviation = np.abs(current - median) / np.where(valid, mad, 1.0)
+        filtered[last] = np.where(valid & (deviation > scaled_threshold), median, current)
+    
+    # Warm-up: partial windows of 3..window_size-1 samples
+    for count in range(3, min(window_size, len(values) + 1)):
+        apply(values[None, :count], np.array([count - 1]))
+    
+    if window_size >= 3 and len(values) >= window_size:
+        windows = np.lib.stride_tricks.sliding_window_view(values, window_size)
+        apply(windows, np.arange(window_size - 1, len(values)))
+    
+    return filtered
+
+
+def run_mvs_batch(csi_matrix, selected_subcarriers, window_size: int, threshold: float,
+                  gain_locked=True, enable_hampel: bool = True,
+                  hampel_window: int = config.HAMPEL_WINDOW,
+                  hampel_threshold: float = config.HAMPEL_THRESHOLD,
+                  enable_lowpass: bool = False,
+                  lowpass_cutoff: float = 11.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Replay a recorded packet sequence through MVS in vectorized form
+    
+    Produces the same per-packet moving variance and state as feeding the
+    packets one by one to MVSDetector (add_turbulence + update_state every
+    packet). Built on mvs_turbulence_batch, moving_variance_batch and the
+    batch state machine; only the low-pass filter, when enabled, runs per
+    sample through SegmentationContext.
+    
+    Args:
+        csi_matrix: (P, 2*S) array of I/Q pairs per packet
+        selected_subcarriers: List of subcarrier indices to use
+        window_size: Size of the sliding window for variance calculation
+        threshold: Threshold for motion detection
+        gain_locked: Gain lock status, a bool or a (P,) bool array per packet
+        enable_hampel: Enable Hampel filter for outlier removal
+        hampel_window: Hampel filter window size
+        hampel_threshold: Hampel filter MAD threshold
+        enable_lowpass: Enable low-pass filter for noise reduction
+        lowpass_cutoff: Low-pass filter cutoff frequency in Hz
+    
+    Returns:
+        tuple: (moving_variance, states) arrays of shape (P,); variance is 0.0
+               until the window is full, states use SegmentationContext.STATE_*
+    """
+    if enable_lowpass:
+        # Low-pass is recursive: run the production chain (Hampel -> low-pass)
+        # per sample on the raw turbulence
+        turbulence = mvs_turbulence_batch(csi_matrix, selected_subcarriers, gain_locked,
+                                          enable_hampel=False)
+        context = SegmentationContext(
+            window_size=window_size,
+            threshold=threshold,
+            enable_hampel=enable_hampel,
+            hampel_window=hampel_window,
+            hampel_threshold=hampel_threshold,
+            enable_lowpass=True,
+            lowpass_cutoff=lowpass_cutoff
+        )
+        filtered = np.empty(len(turbulence))
+        for i, value in enumerate(turbulence.tolist()):
+            context.add_turbulence(value)
+            filtered[i] = context.last_turbulence
+    else:
+        filtered = mvs_turbulence_batch(csi_matrix, selected_subcarriers, gain_locked,
+                                        enable_hampel=enable_hampel,
+                                        hampel_window=hampel_window,
+                                        hampel_threshold=hampel_threshold)
+    
+    moving_variance = moving_variance_batch(filtered, window_size)
+    return moving_variance, _mvs_states_batch(moving_variance, threshold)
+
+
+def moving_variance_batch(filtered, window_size: int) -> np.ndarray:
+    """Per-packet MVS variance: 0.0 until the window is full, then the window variance"""
+    num_packets = len(filtered)
+    moving_variance = np.zeros(num_packets)
+    if num_packets >= window_size:
+        windows = np.lib.stride_tricks.sliding_window_view(filtered, window_size)
+        moving_variance[window_size - 1:] = windows.var(axis=1)
+    return moving_variance
+
+
+def _mvs_states_batch(moving_variance, threshold: float) -> np.ndarray:
+    """Per-packet MVS state from the moving variance (SegmentationContext.STATE_*)"""
+    # Hysteresis: above -> MOTION, below -> IDLE, equal -> keep previous state
+    num_packets = len(moving_variance)
+    idle, motion = SegmentationContext.STATE_IDLE, SegmentationContext.STATE_MOTION
+    decided = (moving_variance > threshold) | (moving_variance < threshold)
+    last_decided = np.maximum.accumulate(np.where(decided, np.arange(num_packets), -1))
+    above = np.append(moving_variance > threshold, False)
+    return np.where(above[last_decided], motion, idle)
+
+
+def stack_packets(packets) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stack packet dicts into one contiguous (P, 2*S) int8 CSI matrix
+    
+    Args:
+        packets: Packet dicts with 'csi_data' (and optional 'gain_locked')
+    
+    Accepts signed I/Q values or raw bytes (0..255, as returned by the
+    ESP32 CSI callback); raw bytes are reinterpreted as int8 like MVSDetector.
+    
+    Returns:
+        tuple: (csi_matrix, gain_locked) with gain_locked a (P,) bool array
+               (missing flags default to True, like MVSDetector)
+    
+    Raises:
+        ValueError: If the packets do not all have the same CSI length
+    """
+    if len(packets) == 0:
+        return np.zeros((0, 0), dtype=np.int8), np.zeros(0, dtype=bool)
+    rows = []
+    for pkt in packets:
+        csi = pkt['csi_data']
+        if isinstance(csi, (bytes, bytearray, memoryview)):
+            csi = np.frombuffer(csi, dtype=np.int8)
+        else:
+            csi = np.asarray(csi)
+            if csi.dtype != np.int8:
+                csi = csi.astype(np.uint8).view(np.int8)
+        rows.append(csi)
+    lengths = {len(csi) for csi in rows}
+    if len(lengths) > 1:
+        raise ValueError(f"Packets have different CSI lengths: {sorted(lengths)}")
+    csi_matrix = np.stack(rows)
+    gain_locked = np.array([bool(pkt.get('gain_locked', True)) for pkt in packets])
+    return csi_matrix, gain_locked
+
+
+def mvs_turbulence_batch(csi_matrix, selected_subcarriers, gain_locked=True,
+                         enable_hampel: bool = True,
+                         hampel_window: int = config.HAMPEL_WINDOW,
+                         hampel_threshold: float = config.HAMPEL_THRESHOLD) -> np.ndarray:
+    """
+    Turbulence sequence exactly as MVSDetector buffers it
+    
+    Applies per-packet gain lock (raw std or CV) and the Hampel filter with
+    hampel_filter_batch. The result only depends on the band, so parameter
+    sweeps can stack the packets once (stack_packets), compute this once per
+    band and pass it to test_mvs_configuration().
+    
+    Args:
+        csi_matrix: (P, 2*S) array of I/Q pairs per packet
+        selected_subcarriers: List of subcarrier indices to use
+        gain_locked: Gain lock status, a bool or a (P,) bool array per packet
+        enable_hampel: Enable Hampel filter for outlier removal
+        hampel_window: Hampel filter window size
+        hampel_threshold: Hampel filter MAD threshold
+    
+    Returns:
+        np.ndarray: Filtered turbulence per packet, shape (P,)
+    """
+    if len(csi_matrix) == 0:
+        return np.zeros(0)
+    gain_locked = np.asarray(gain_locked, dtype=bool)
+    
+    if gain_locked.all():
+        turbulence = calculate_spatial_turbulence_batch(csi_matrix, selected_subcarriers, True)
+    elif not gain_locked.any():
+        turbulence = calculate_spatial_turbulence_batch(csi_matrix, selected_subcarriers, False)
+    else:
+        turbulence = np.where(
+            gain_locked,
+            calculate_spatial_turbulence_batch(csi_matrix, selected_subcarriers, True),
+            calculate_spatial_turbulence_batch(csi_matrix, selected_subcarriers, False),
+        )
+    
+    if enable_hampel:
+        return hampel_filter_batch(turbulence, hampel_window, hampel_threshold)
+    return turbulence
+
+
 class MVSDetector:
     """
     Streaming MVS (Moving Variance of Spatial turbulence) detector
@@ -1513,16 +1754,25 @@ class MVSDetector:
 
 
 def test_mvs_configuration(baseline_packets, movement_packets,
-                          subcarriers, threshold, window_size) -> Tuple[int, int, float]:
+                          subcarriers, threshold, window_size,
+                          turbulence: Optional[np.ndarray] = None,
+                          moving_variance: Optional[np.ndarray] = None) -> Tuple[int, int, float]:
     """
     Test MVS configuration and return FP, TP counts
     
+    Same counts as streaming baseline then movement through one MVSDetector
+    (buffer kept warm across the boundary), computed in vectorized form.
+    
     Args:
         baseline_packets: List of baseline packets
         movement_packets: List of movement packets
         subcarriers: List of subcarrier indices to use
         threshold: Motion detection threshold
         window_size: Sliding window size
+        turbulence: Optional precomputed mvs_turbulence_batch() of the stacked
+                    baseline + movement packets for `subcarriers` (reuse across a sweep)
+        moving_variance: Optional precomputed moving_variance_batch() of that
+                         turbulence for `window_size` (reuse across thresholds)
     
     Returns:
         tuple: (fp, tp, score)
@@ -1530,20 +1780,17 @@ def test_mvs_configuration(baseline_packets, movement_packets,
     num_baseline = len(baseline_packets)
     num_movement = len(movement_packets)
 
-    # Test on baseline (FP)
-    detector = MVSDetector(window_size, threshold, subcarriers)
-    for pkt in baseline_packets:
-        detector.process_packet(pkt)
-    fp = detector.get_motion_count()
-
     # Keep the turbulence buffer warm across baseline -> movement to match
-    # real performance tests and runtime behavior. Reset only motion counter.
-    detector.motion_packet_count = 0
-
-    # Test on movement (TP)
-    for pkt in movement_packets:
-        detector.process_packet(pkt)
-    tp = detector.get_motion_count()
+    # real performance tests and runtime behavior.
+    if moving_variance is None:
+        if turbulence is None:
+            csi_matrix, gain_locked = stack_packets(list(baseline_packets) + list(movement_packets))
+            turbulence = mvs_turbulence_batch(csi_matrix, subcarriers, gain_locked)
+        moving_variance = moving_variance_batch(turbulence, window_size)
+    motion = _mvs_states_batch(moving_variance, threshold) == SegmentationContext.STATE_MOTION
+
+    fp = int(np.count_nonzero(motion[:num_baseline]))
+    tp = int(np.count_nonzero(motion[num_baseline:]))
 
     fn = max(0, num_movement - tp)
     recall = (tp / num_movement * 100.0) if num_movement > 0 else 0.0